@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("TweetStore Logger")
+
+POLITICAL_PATTERN = "trump|biden|politics"
+
+
+class TweetStore(object):
+    def __init__(self, root: str):
+        """An incremental store of daily tweet aggregates
+
+        Every crawled shard is parsed once and its aggregates are written as
+        gzip pickles keyed by the shard date, so adding a day only costs the
+        work of that day. The size and modification time of each source file
+        are kept in a manifest, and a shard is rebuilt when its source changes,
+        e.g. when a partially crawled day is crawled again.
+
+        A store is fed either by daily shards with `update` or by a concatenated
+        pickle with `import_pickle`, not both. Their shards are keyed by crawl
+        date and tweet date respectively and would overlap, so shards from
+        another source are dropped before new ones are added.
+
+        Args:
+            root (str): The directory of the store
+        """
+        self.root = root
+        self.daily_dir = os.path.join(root, "daily")
+        self.url_dir = os.path.join(root, "urls")
+        self.manifest_path = os.path.join(root, "shards.json")
+        os.makedirs(self.daily_dir, exist_ok=True)
+        os.makedirs(self.url_dir, exist_ok=True)
+
+    @staticmethod
+    def extract_urls(df_tweets: pd.DataFrame) -> pd.DataFrame:
+        """Extract the URL counts of processed tweets
+
+        Args:
+            df_tweets (pd.DataFrame): The processed tweets indexed by date
+
+        Returns:
+            (pd.DataFrame): The count of each URL and domain by date
+        """
+        entities = df_tweets["Entities"].astype(object)
+        entities = entities[entities.map(lambda x: isinstance(x, dict))]
+        urls = entities.str.get("urls").explode().dropna().str.get("expanded_url").dropna()
+        df_urls = pd.DataFrame({"URL": urls.values, "Date": urls.index}, dtype=object)
+        df_urls["Domain"] = df_urls["URL"].str.split("/", n=3).str[:3].str.join("/")
+        df_urls = df_urls.groupby(["URL", "Date", "Domain"]).size().rename("Count")
+        return df_urls.reset_index()
+
+    @staticmethod
+    def _stamp(path: str, origin: str) -> Dict[str, object]:
+        stat = os.stat(path)
+        return {
+            "origin": os.path.abspath(origin),
+            "source": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+        }
+
+    @staticmethod
+    def _entropy(df_urls: pd.DataFrame) -> pd.Series:
+        prob = df_urls["Count"] / df_urls.groupby(["Date"])["Count"].transform("sum")
+        return (-prob * np.log(prob)).groupby(df_urls["Date"]).sum()
+
+    def _drop_other_origins(self, origin: str):
+        manifest, origin = self._load_manifest(), os.path.abspath(origin)
+        others = [shard for shard, val in manifest.items() if val.get("origin") != origin]
+        if others:
+            logger.warning("Drop {} shards from other sources than {}".format(len(others), origin))
+        for shard in others:
+            self.remove_shard(shard)
+
+    def _load_manifest(self) -> Dict[str, Dict[str, object]]:
+        if not os.path.exists(self.manifest_path):
+            return dict()
+        with open(self.manifest_path, "r") as f:
+            return json.loads(f.read())
+
+    def _save_manifest(self, manifest: Dict[str, Dict[str, object]]):
+        with open(self.manifest_path, "w") as f:
+            f.write(json.dumps(manifest, indent=4, sort_keys=True))
+
+    def shards(self) -> List[str]:
+        """Get the dates of the shards already stored"""
+        return sorted(self._load_manifest())
+
+    def add_shard(self, shard: str, df_tweets: pd.DataFrame, stamp: Optional[Dict] = None):
+        """Aggregate a shard of processed tweets and save it into the store
+
+        Args:
+            shard (str): The date of the shard, e.g. 20230203
+            df_tweets (pd.DataFrame): The processed tweets indexed by date
+            stamp (Dict): The size and modification time of the source file
+        """
+        df_urls = self.extract_urls(df_tweets)
+        political = df_urls["URL"].str.contains(POLITICAL_PATTERN, regex=True)
+        df_daily = pd.DataFrame({
+            "Tweet Count": df_tweets.groupby(level=0)["Text"].count(),
+            "URL Count": df_urls.groupby(["Date"])["Count"].sum(),
+            "Political Count": df_urls[political].groupby(["Date"])["Count"].sum(),
+            "Non-Political Count": df_urls[~political].groupby(["Date"])["Count"].sum(),
+        }).fillna(0).astype(int)
+        df_daily.index.name = "Date"
+        df_urls.to_pickle(os.path.join(self.url_dir, f"{shard}.pkl"), compression="gzip")
+        df_daily = df_daily.reset_index()
+        df_daily.to_pickle(os.path.join(self.daily_dir, f"{shard}.pkl"), compression="gzip")
+        # The manifest is written last and marks the shard as complete
+        manifest = self._load_manifest()
+        manifest[shard] = stamp or dict()
+        self._save_manifest(manifest)
+
+    def remove_shard(self, shard: str):
+        """Remove a shard from the store
+
+        Args:
+            shard (str): The date of the shard, e.g. 20230203
+        """
+        manifest = self._load_manifest()
+        manifest.pop(shard, None)
+        self._save_manifest(manifest)
+        for directory in [self.daily_dir, self.url_dir]:
+            path = os.path.join(directory, f"{shard}.pkl")
+            if os.path.exists(path):
+                os.remove(path)
+
+    def update(
+        self, shard_dir: str, start_date: str, end_date: str, force: bool = False
+    ) -> List[str]:
+        """Add the crawled shards which are new or changed since they were stored
+
+        Shards imported from a concatenated pickle are dropped first.
+
+        Args:
+            shard_dir (str): The directory of the gzip pickled shards
+            start_date (str): The start date of the shards
+            end_date (str): The end date of the shards, excluded
+            force (bool): Rebuild every shard even if its source is unchanged
+
+        Returns:
+            (List[str]): The dates of the added or rebuilt shards
+        """
+        end_date = pd.Timestamp(end_date) - pd.Timedelta(1, unit="day")
+        shards = [date.strftime("%Y%m%d") for date in pd.date_range(start_date, end_date)]
+        missing = [s for s in shards if not os.path.exists(os.path.join(shard_dir, f"{s}.pkl"))]
+        if missing:
+            raise FileNotFoundError(f"Shards have not been crawled in {shard_dir}: {missing}")
+
+        self._drop_other_origins(shard_dir)
+        manifest, added = self._load_manifest(), list()
+        for shard in shards:
+            path = os.path.join(shard_dir, f"{shard}.pkl")
+            stamp = self._stamp(path, shard_dir)
+            if not force and manifest.get(shard) == stamp:
+                continue
+            self.add_shard(shard, pd.read_pickle(path, compression="gzip"), stamp)
+            added.append(shard)
+        return added
+
+    def import_pickle(self, path: str, force: bool = False) -> List[str]:
+        """Split a concatenated pickle of processed tweets by date into the store
+
+        Shards from crawled shard directories or other pickles are dropped first.
+
+        Args:
+            path (str): The gzip pickle of processed tweets indexed by date
+            force (bool): Rebuild the shards even if the pickle is unchanged
+
+        Returns:
+            (List[str]): The dates of the added or rebuilt shards
+        """
+        self._drop_other_origins(path)
+        manifest, stamp = self._load_manifest(), self._stamp(path, path)
+        if not force and manifest and all(val == stamp for val in manifest.values()):
+            return list()
+        for shard in manifest:
+            self.remove_shard(shard)
+        df_tweets, added = pd.read_pickle(path, compression="gzip"), list()
+        for shard, df in df_tweets.groupby(level=0):
+            self.add_shard(shard, df, stamp)
+            added.append(shard)
+        return added
+
+    def _read(self, directory: str) -> pd.DataFrame:
+        shards = self.shards()
+        if not shards:
+            raise ValueError(f"The tweet store {self.root} is empty, add shards first")
+        paths = [os.path.join(directory, f"{shard}.pkl") for shard in shards]
+        dfs = [pd.read_pickle(path, compression="gzip") for path in paths]
+        df = pd.concat(dfs, ignore_index=True)
+        df["Date"] = df["Date"].astype(str)
+        return df
+
+    def load_daily(self) -> pd.DataFrame:
+        """Load the daily aggregates of all shards
+
+        Returns:
+            (pd.DataFrame): The tweet, URL and political counts indexed by date
+        """
+        return self._read(self.daily_dir).groupby(["Date"]).sum().sort_index()
+
+    def load_urls(self) -> pd.DataFrame:
+        """Load the URL counts of all shards
+
+        Returns:
+            (pd.DataFrame): The count of each URL by date indexed by URL
+        """
+        df_urls = self._read(self.url_dir).groupby(["URL", "Date", "Domain"])["Count"].sum()
+        df_urls = df_urls.reset_index()
+        return df_urls.sort_values(["Count"], ascending=False).set_index(["URL"])
+
+    def build_features(
+        self,
+        popular_url: Tuple[int, int] = (1, 10),
+        popular_domain: Tuple[int, int] = (1, 25),
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """Build the daily features from the stored aggregates
+
+        Args:
+            popular_url (Tuple[int, int]): The rank range of popular URLs
+            popular_domain (Tuple[int, int]): The rank range of popular domains, also used
+                for the domains of non-political URLs
+            columns (List[str]): The features to keep, all features by default
+
+        Returns:
+            (pd.DataFrame): The daily features indexed by date
+        """
+        df_daily, df_urls = self.load_daily(), self.load_urls()
+        political = df_urls.index.str.contains(POLITICAL_PATTERN, regex=True)
+        df_nopolitic_urls = df_urls[~political]
+        urls = df_urls.groupby(level=0)["Count"].sum().sort_values(ascending=False)
+        domains = df_urls.groupby(["Domain"])["Count"].sum().sort_values(ascending=False)
+        nonpolitic_domains = df_nopolitic_urls.groupby(["Domain"])["Count"].sum()
+        nonpolitic_domains = nonpolitic_domains.sort_values(ascending=False)
+        most_popular_url = urls.index[:1]
+        urls = urls.index[slice(*popular_url)]
+        domains = domains.index[slice(*popular_domain)]
+        nonpolitic_domains = nonpolitic_domains.index[slice(*popular_domain)]
+
+        most_popular_url_count = df_urls[df_urls.index.isin(most_popular_url)]
+        most_popular_url_count = most_popular_url_count.groupby(["Date"])["Count"].sum()
+        popular_url_count = df_urls[df_urls.index.isin(urls)].groupby(["Date"])["Count"].sum()
+        popular_domain_count = df_urls[df_urls["Domain"].isin(domains)]
+        popular_domain_count = popular_domain_count.groupby(["Date"])["Count"].sum()
+        nonpolitic_domain_urls = df_nopolitic_urls["Domain"].isin(nonpolitic_domains)
+        nonpolitic_domain_count = df_nopolitic_urls[nonpolitic_domain_urls]
+        nonpolitic_domain_count = nonpolitic_domain_count.groupby(["Date"])["Count"].sum()
+
+        df_features = pd.DataFrame(index=df_daily.index)
+        df_features["Tweet Count"] = df_daily["Tweet Count"]
+        df_features["Popular URL Count"] = popular_url_count
+        df_features["Political Tweet Count"] = df_daily["Political Count"]
+        df_features["Non-Political Tweet Count"] = df_daily["Non-Political Count"]
+        df_features["URL Count"] = df_daily["URL Count"]
+        df_features["Popular Domain Count"] = popular_domain_count
+        df_features["Most Popular Tweet"] = most_popular_url_count
+        df_features["Popular Non-Politic Domain"] = nonpolitic_domain_count
+        df_features["URL Entropy"] = self._entropy(df_urls)
+        df_features["Non-Politic URL Entropy"] = self._entropy(df_nopolitic_urls)
+        df_features = df_features.fillna(0)
+        df_features.index = pd.to_datetime(df_features.index, format="%Y%m%d")
+        return df_features if columns is None else df_features[columns]
@@ -0,0 +1,132 @@
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from TweetStore import TweetStore
+
+
+def extract_url(tweet: pd.Series, urls: List[str]):
+    if isinstance(tweet["Entities"], dict):
+        for url_entity in tweet["Entities"].get("urls", list()):
+            url = url_entity["expanded_url"]
+            urls.append([url, tweet.name])
+
+
+def make_tweets() -> pd.DataFrame:
+    entities = [
+        {"urls": [{"expanded_url": "https://apnews.com/article/ohio-train"},
+                  {"expanded_url": "https://twitter.com/a/status/1/video/1"}]},
+        {"urls": [{"expanded_url": "https://apnews.com/article/ohio-train"}]},
+        {"mentions": [{"username": "someone"}]},
+        np.nan,
+        {"urls": [{"expanded_url": "https://www.foxnews.com/politics/biden-ohio"}]},
+        {"urls": [{"expanded_url": "https://apnews.com"}]},
+    ]
+    index = pd.Index(["20230203", "20230203", "20230203", "20230204", "20230204", "20230204"])
+    index.name = "Date"
+    texts = ["a", "b", "c", "d", "e", None]
+    return pd.DataFrame({"Text": texts, "Entities": entities}, index=index)
+
+
+def test_extract_urls_matches_row_wise_extraction():
+    df_tweets = make_tweets()
+    urls = list()
+    df_tweets.apply(lambda x: extract_url(x, urls), axis=1)
+    expected = pd.DataFrame(urls, columns=["URL", "Date"])
+    expected["Count"] = 1
+    expected = expected.groupby(["URL", "Date"]).sum().reset_index()
+    expected["Domain"] = expected["URL"].apply(lambda url: "/".join(url.split("/")[:3]))
+
+    result = TweetStore.extract_urls(df_tweets)
+    columns = ["URL", "Date", "Domain", "Count"]
+    pd.testing.assert_frame_equal(
+        result[columns].sort_values(["URL", "Date"]).reset_index(drop=True),
+        expected[columns].sort_values(["URL", "Date"]).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_extract_urls_without_entities():
+    df_tweets = make_tweets()
+    df_tweets["Entities"] = np.nan
+    assert TweetStore.extract_urls(df_tweets).empty
+
+
+def test_update_and_build_features(tmp_path):
+    shard_dir = tmp_path / "pkl"
+    shard_dir.mkdir()
+    df_tweets = make_tweets()
+    df_tweets.loc["20230203"].to_pickle(shard_dir / "20230203.pkl", compression="gzip")
+    df_tweets.loc["20230204"].to_pickle(shard_dir / "20230204.pkl", compression="gzip")
+
+    store = TweetStore(str(tmp_path / "store"))
+    with pytest.raises(ValueError):
+        store.load_daily()
+    with pytest.raises(FileNotFoundError):
+        store.update(str(shard_dir), "20230203", "20230206")
+    assert store.shards() == list()
+    assert store.update(str(shard_dir), "20230203", "20230205") == ["20230203", "20230204"]
+    assert store.update(str(shard_dir), "20230203", "20230205") == list()
+
+    df_features = store.build_features(popular_url=(0, 1), popular_domain=(0, 1))
+    assert df_features["Tweet Count"].tolist() == [3, 2]
+    assert df_features["URL Count"].tolist() == [3, 2]
+    assert df_features["Political Tweet Count"].tolist() == [0, 1]
+    assert df_features["Popular URL Count"].tolist() == [2, 0]
+    assert df_features["Popular Domain Count"].tolist() == [2, 1]
+
+    # A re-crawled shard is picked up without forcing
+    df_tweets.loc["20230204"].iloc[:1].to_pickle(shard_dir / "20230204.pkl", compression="gzip")
+    assert store.update(str(shard_dir), "20230203", "20230205") == ["20230204"]
+    assert store.load_daily()["Tweet Count"].tolist() == [3, 1]
+    assert store.update(str(shard_dir), "20230203", "20230205", force=True) == [
+        "20230203", "20230204"]
+
+    # A touched shard of the same size is rebuilt as well
+    stat = os.stat(shard_dir / "20230203.pkl")
+    os.utime(shard_dir / "20230203.pkl", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert store.update(str(shard_dir), "20230203", "20230205") == ["20230203"]
+
+
+def test_import_pickle(tmp_path):
+    path = os.path.join(tmp_path, "Tweets.pkl")
+    make_tweets().to_pickle(path, compression="gzip")
+    store = TweetStore(str(tmp_path / "store"))
+    assert store.import_pickle(path) == ["20230203", "20230204"]
+    assert store.import_pickle(path) == list()
+    assert store.load_daily()["Tweet Count"].tolist() == [3, 2]
+
+
+def test_other_sources_are_dropped(tmp_path):
+    shard_dir = tmp_path / "pkl"
+    shard_dir.mkdir()
+    df_tweets = make_tweets()
+    # The crawl shard of 20230204 also holds a tweet of the previous EST date
+    df_tweets.iloc[:2].to_pickle(shard_dir / "20230203.pkl", compression="gzip")
+    df_tweets.iloc[2:].to_pickle(shard_dir / "20230204.pkl", compression="gzip")
+    path = os.path.join(tmp_path, "Tweets.pkl")
+    df_tweets.to_pickle(path, compression="gzip")
+
+    store = TweetStore(str(tmp_path / "store"))
+    store.import_pickle(path)
+    assert store.update(str(shard_dir), "20230203", "20230205") == ["20230203", "20230204"]
+    assert store.load_daily()["Tweet Count"].sum() == df_tweets["Text"].count()
+
+    assert store.import_pickle(path) == ["20230203", "20230204"]
+    assert store.load_daily()["Tweet Count"].sum() == df_tweets["Text"].count()
+
+
+def test_build_features_alternatives(tmp_path):
+    path = os.path.join(tmp_path, "Tweets.pkl")
+    make_tweets().to_pickle(path, compression="gzip")
+    store = TweetStore(str(tmp_path / "store"))
+    store.import_pickle(path)
+
+    df_features = store.build_features(popular_domain=(0, 1))
+    assert df_features["Most Popular Tweet"].tolist() == [2, 0]
+    assert df_features["Popular Non-Politic Domain"].tolist() == [2, 1]
+    expected = [np.log(3) - 2 / 3 * np.log(2), 0]
+    assert df_features["Non-Politic URL Entropy"].tolist() == pytest.approx(expected)